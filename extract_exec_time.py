@@ -8,14 +8,28 @@ Assumptions:
       logs are expected to be formatted as TOIL logs.
     - Synapse credentials are provided in .synapseConfig
 """
+import io
 import os
-import re
+import csv
 import argparse
+import functools
+import tempfile
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import synapseclient
 
+STDERR_PREFIX = "STDERR: "
+
+# Length of an ISO timestamp truncated to microseconds, as fromisoformat()
+# does not support the nanoseconds logged by TOIL.
+TIMESTAMP_LEN = len("YYYY-MM-DDThh:mm:ss.ffffff")
+
+# Most IDs accepted per /userGroupHeaders/batch request.
+MAX_HEADER_IDS = 100
+
 
 def get_args():
     """Set up command-line interface and get arguments."""
@@ -27,13 +41,17 @@ def get_args():
     parser.add_argument("-o", "--output_file",
                         type=str, default="results.csv",
                         help="Filename for output CSV file")
+    parser.add_argument("-t", "--threads",
+                        type=int, default=8,
+                        help="Number of submissions to process concurrently")
     parser.add_argument("--dryrun", action="store_true")
     return parser.parse_args()
 
 
 def get_submissions(syn, view_id):
     """
-    Return df of `id` and `submitterid` of ACCEPTED submissions.
+    Return query results of `id` and `submitterid` of ACCEPTED submissions,
+    iterable as rows of [id, submitterid].
 
     Assumptions:
         - Valid and scored submissions have `status` of ACCEPTED.
@@ -43,17 +61,34 @@ def get_submissions(syn, view_id):
         f"FROM {view_id} "
         "WHERE status = 'ACCEPTED'"
     )
-    return syn.tableQuery(query).asDataFrame()
+    return syn.tableQuery(query, includeRowIdAndRowVersion=False)
 
 
-def get_team_name(syn, uid):
-    """Return team name or username of given ID."""
-    name = ""
-    try:
-        name = syn.getTeam(uid).get('name')
-    except synapseclient.core.exceptions.SynapseHTTPError:
-        name = syn.getUserProfile(uid).get('userName')
-    return name
+def resolve_names(syn, uids):
+    """Return team names or usernames of given IDs, as a dict.
+
+    Teams and users are resolved together with the batch UserGroupHeader
+    endpoint, `MAX_HEADER_IDS` at a time.
+    """
+    uids = list(uids)
+    names = {}
+    for i in range(0, len(uids), MAX_HEADER_IDS):
+        batch = ",".join(map(str, uids[i:i + MAX_HEADER_IDS]))
+        headers = syn.restGET(f"/userGroupHeaders/batch?ids={batch}")
+        for header in headers.get('children', []):
+            names[header.get('ownerId')] = header.get('userName')
+    return names
+
+
+@functools.lru_cache(maxsize=128)
+def get_folder_files(syn, folder_id):
+    """Return dict of filename to Synapse ID of files in given folder.
+
+    Results are cached, as submissions from the same submitter share a
+    folder.
+    """
+    return {child.get('name'): child.get('id')
+            for child in syn.getChildren(folder_id, includeTypes=["file"])}
 
 
 def find_log_file(syn, submission):
@@ -64,43 +99,81 @@ def find_log_file(syn, submission):
         if x.get('key').endswith("SubmissionFolder")
     ][0]
     filename = f"{submission.id}_logs"
-    file_id = syn.findEntityId(f"{filename}.zip", folder_id)
+    file_id = get_folder_files(syn, folder_id).get(f"{filename}.zip")
     return file_id, filename
 
 
-def unzip_file(f, path="."):
-    """Unzip file."""
-    if zipfile.is_zipfile(f):
-        with zipfile.ZipFile(f) as zip_ref:
-            zip_ref.extractall(path=path)
-    else:
-        print(f"{f} is not a zip file.")
+def open_log_stream(zip_path, member_name):
+    """Open a file inside a zip archive as a text stream, without
+    extracting it to disk."""
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        return io.TextIOWrapper(zip_ref.open(member_name), encoding="utf-8")
+
+
+def get_event_time(line, event):
+    """Return timestamp of line if it logs `event` for run_docker.cwl,
+    else None."""
+    if event not in line:
+        return None
+    prefix_end = line.find(STDERR_PREFIX)
+    if prefix_end == -1:
+        return None
+    ts_start = prefix_end + len(STDERR_PREFIX)
+    ts_end = ts_start + TIMESTAMP_LEN
+    rest = line[ts_end:]
+    if event not in rest or "run_docker.cwl" not in rest:
+        return None
+    try:
+        return datetime.fromisoformat(line[ts_start:ts_end])
+    except ValueError:
+        return None
 
 
-def calc_exec_time(log_file):
+def calc_exec_time(log):
     """
     Find time difference in sec between when run_docker job starts
     and ends.
 
     Important!
         - Returned time includes time it takes to `docker pull`.
+
+    Args:
+        log: file-like object of the log, iterated line by line
     """
-    with open(log_file) as f:
-        log = f.read()
-        try:
-            start_time = re.search(
-                r"STDERR: ([\d\-T:]+?\.\d{6})\d+?Z.*?Issued job.*?run_docker\.cwl",
-                log).group(1)
-            start_time = datetime.fromisoformat(start_time)
-            end_time = re.search(
-                r"STDERR: ([\d\-T:]+?\.\d{6})\d+?Z.*?Job ended.*?run_docker\.cwl",
-                log).group(1)
-            end_time = datetime.fromisoformat(end_time)
-        except AttributeError:
-            return "run_docker step not found"
+    start_time = end_time = None
+    # Only look for the end of the step once its start has been found, and
+    # stop reading as soon as both are known.
+    for line in log:
+        if start_time is None:
+            start_time = get_event_time(line, "Issued job")
         else:
-            exec_time = end_time - start_time
-            return exec_time.total_seconds()
+            end_time = get_event_time(line, "Job ended")
+            if end_time:
+                break
+    if start_time is None or end_time is None:
+        return "run_docker step not found"
+    exec_time = end_time - start_time
+    return exec_time.total_seconds()
+
+
+def process_submission(syn, sub_id):
+    """Download log file of given submission and return its exec time."""
+    submission = syn.getSubmissionStatus(sub_id)
+    log_id, filename = find_log_file(syn, submission)
+
+    # Download to a scratch directory so concurrent downloads can't clash;
+    # it is removed along with the zip file once the log has been read.
+    with tempfile.TemporaryDirectory() as tmpdir:
+        syn.get(log_id, downloadLocation=tmpdir)
+
+        # Stream log out of the zip file, then extract time duration.
+        zip_path = os.path.join(tmpdir, f"{filename}.zip")
+        try:
+            with open_log_stream(zip_path, f"{filename}.txt") as log:
+                return calc_exec_time(log)
+        except zipfile.BadZipFile:
+            print(f"{filename}.zip is not a zip file.")
+            return ""
 
 
 def main():
@@ -113,33 +186,33 @@ def main():
         syn.login(authToken=os.getenv('authtoken'),
                   silent=True)
 
-    submissions_df = get_submissions(syn, args.submission_view_id)
-    submissions_df["team_name"] = ""
-    submissions_df["exec_time(s)"] = ""
-    for _, row in submissions_df.iterrows():
-        # Find team/username based on submitterid (for easier comprehension).
-        submissions_df.at[_, "team_name"] = get_team_name(
-            syn, row['submitterid'])
-
-        # Download zipped log file.
-        sub_id = row['id']
-        submission = syn.getSubmissionStatus(sub_id)
-        log_id, filename = find_log_file(syn, submission)
-        syn.get(log_id, downloadLocation=".")
-
-        # Unzip file, then extract time duration from logs.
-        unzip_file(f"{filename}.zip")
-        submissions_df.at[_, "exec_time(s)"] = calc_exec_time(
-            f"{filename}.txt")
-
-        # Remove zip + txt file, since they're no longer needed.
-        for ext in [".zip", ".txt"]:
-            os.remove(filename + ext)
-
-        # For dryruns, only perform one iteration.
-        if args.dryrun:
-            break
-    submissions_df.to_csv(args.output_file, index=False)
+    # Map each submission ID to its submitterid, keeping view order.
+    submitters = OrderedDict(
+        (row[0], row[1])
+        for row in get_submissions(syn, args.submission_view_id))
+
+    # For dryruns, only process the first submission.
+    sub_ids = list(submitters)
+    if args.dryrun:
+        sub_ids = sub_ids[:1]
+
+    # Find team/username based on submitterid (for easier comprehension).
+    # Teams usually submit more than once, so only look up each ID once.
+    unique_ids = OrderedDict.fromkeys(submitters[sub_id] for sub_id in sub_ids)
+    id_to_name = resolve_names(syn, unique_ids)
+
+    # Write each row as soon as its submission is done, so that results
+    # processed so far are kept if a later submission fails.
+    with open(args.output_file, "w", newline="") as out, \
+            ThreadPoolExecutor(max_workers=args.threads) as executor:
+        writer = csv.writer(out)
+        writer.writerow(["id", "submitterid", "team_name", "exec_time(s)"])
+        exec_times = executor.map(
+            functools.partial(process_submission, syn), sub_ids)
+        for sub_id, exec_time in zip(sub_ids, exec_times):
+            submitterid = submitters[sub_id]
+            writer.writerow([sub_id, submitterid,
+                             id_to_name.get(submitterid, ""), exec_time])
 
 
 if __name__ == "__main__":
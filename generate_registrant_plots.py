@@ -1,13 +1,56 @@
 """Creates barplots of DREAM challenge registrants."""
 
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
 from challengeutils import teams
 import synapseclient
+import numpy as np
 import pandas as pd
 import seaborn as sns
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.style as style
 
 
+def get_args():
+    """Set up command-line interface and get arguments."""
+
+    parser = argparse.ArgumentParser(
+        description="Plot DREAM challenge registrants.")
+    parser.add_argument("-o", "--out",
+                        type=str, default=None,
+                        help=("Filename for output PNG; if not given, the "
+                              "plot is shown interactively"))
+    return parser.parse_args()
+
+
+@functools.lru_cache(maxsize=None)
+def setup_plot_style():
+    """Apply plot settings, once, on first use."""
+
+    style.use('seaborn-talk')
+    style.use('ggplot')
+    plt.rcParams['font.sans-serif'] = 'Lato'
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['text.color'] = '#909090'
+    plt.rcParams['axes.labelcolor'] = '#909090'
+    plt.rcParams['xtick.color'] = '#909090'
+    plt.rcParams['ytick.color'] = '#909090'
+    plt.rcParams['font.size'] = 10
+
+
+@functools.lru_cache(maxsize=256)
+def get_team_size(syn, team_id):
+    """Return number of members in given team.
+
+    Results are cached, as the same team may be shared across challenges.
+    """
+
+    return len(teams._get_team_set(syn, team_id))  # pylint: disable=W0212
+
+
 def query_challenges_table(syn, syn_id):
     """Query a Synapse table for challenge data.
 
@@ -20,23 +63,28 @@ def query_challenges_table(syn, syn_id):
         f"""select challenge, challengeYear, monetaryIncentive,
         containerization, challengeParticipants, challengePreregistrants
         from {syn_id} where challengeYear <> 'TBD' """).asDataFrame().fillna("")
-    columns = ["Challenge", "Year", "Registered", "MoneyPrize", "Docker"]
-    counts = []
-    for _, row in challenges.iterrows():
-        reg = teams._get_team_set(syn,  # pylint: disable=W0212
-                                  row['challengeParticipants'])
-        count = pd.DataFrame(
-            [[row['challenge'], row['challengeYear'], len(reg),
-              row['monetaryIncentive'], row['containerization']]],
-            columns=columns)
-        counts.append(count)
-    return pd.concat(counts, ignore_index=True)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        registered = np.fromiter(
+            executor.map(functools.partial(get_team_size, syn),
+                         challenges['challengeParticipants']),
+            dtype=np.int32, count=len(challenges))
+    return pd.DataFrame({
+        "Challenge": challenges['challenge'].values,
+        "Year": challenges['challengeYear'].values,
+        "Registered": registered,
+        "MoneyPrize": challenges['monetaryIncentive'].values,
+        "Docker": challenges['containerization'].values})
 
 
 def plot_table(table_data, yaxis,
-               xlab, ylab):
-    """Plot a bar plot of the challenge data."""
+               xlab, ylab, outfile=None):
+    """Plot a bar plot of the challenge data.
 
+    If `outfile` is given, the plot is saved there instead of shown.
+    """
+
+    setup_plot_style()
     participants = sns.catplot(y=yaxis, kind="count",
                                data=table_data, dodge=False)
     participants.set(xlabel=xlab, ylabel=ylab)
@@ -46,7 +94,11 @@ def plot_table(table_data, yaxis,
     # participants.patch.set_facecolor("white")
     # for spine in ['left', 'right', 'top', 'bottom']:
     #     participants.spines[spine].set_color('k')
-    plt.show()
+    if outfile:
+        participants.fig.savefig(outfile, dpi=150, bbox_inches="tight")
+        plt.close(participants.fig)
+    else:
+        plt.show()
 
 
 def main():
@@ -57,21 +109,17 @@ def main():
         - account has access to DREAM Landscape table (syn21645842)
     """
 
-    # Setup initial plot settings
-    style.use('seaborn-talk')
-    style.use('ggplot')
-    plt.rcParams['font.sans-serif'] = 'Lato'
-    plt.rcParams['font.family'] = 'sans-serif'
-    plt.rcParams['text.color'] = '#909090'
-    plt.rcParams['axes.labelcolor'] = '#909090'
-    plt.rcParams['xtick.color'] = '#909090'
-    plt.rcParams['ytick.color'] = '#909090'
-    plt.rcParams['font.size'] = 10
+    args = get_args()
+
+    # Saving to file doesn't need a GUI, so skip loading one.
+    if args.out:
+        matplotlib.use("Agg")
 
     syn = synapseclient.login(silent=True)
 
     table = query_challenges_table(syn, "syn21645842")
-    plot_table(table, yaxis="Year", xlab="# of Challenges", ylab="Year")
+    plot_table(table, yaxis="Year", xlab="# of Challenges", ylab="Year",
+               outfile=args.out)
     print(table)
 
 
@@ -8,14 +8,17 @@ Optional:
     -e/--end_date       End date for submissions tracking
 """
 
-import re
 import argparse
+import functools
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import synapseclient
-from challengeutils import utils
 from challengeutils import teams
 
+_EVAL_SKIP_TERMS = ("test", "write-up", "uw")
+
 
 def get_args():
     """Set up command-line interface and get arguments."""
@@ -58,63 +61,110 @@ def get_challenge_info(syn, challenge):
     # Filter out IDs of evaluations for writeups and tests.
     eval_obj = syn.restGET(f"/entity/{challenge}/evaluation").get("results")
     eval_ids = [e.get("id") for e in eval_obj
-                if not re.search(r"test|write-up|uw", e.get("name"), re.I)]
+                if not any(term in e.get("name").lower()
+                           for term in _EVAL_SKIP_TERMS)]
 
     return c_id, name, team, eval_ids
 
 
+@functools.lru_cache(maxsize=256)
+def get_participants(syn, team):
+    """Return IDs of users in given participant team.
+
+    Results are cached, as the same team may be shared across challenges.
+    """
+
+    return frozenset(user.get('ownerId')
+                     for user in teams._get_team_set(syn, team))  # pylint: disable=W0212
+
+
 def convert_to_epoch(dt):  # pylint: disable-msg=C0103
     """Convert given datetime to Epoch timestamp in milliseconds."""
 
-    return int(datetime.strptime(dt, "%Y-%m-%dT%H:%M:%S").timestamp() * 1000)
+    return int(datetime.fromisoformat(dt).timestamp() * 1000)
+
+
+def count_eval_submissions(syn, eval_id, start=None, end=None):
+    """Count valid submissions from a given evaluation.
+
+    Returns:
+        count: number of ACCEPTED submissions in the queue
+    """
+
+    query = f"SELECT * FROM evaluation_{eval_id} WHERE status == 'ACCEPTED'"
+    if start:
+        query += f" AND createdOn >= {start}"
+    if end:
+        query += f" AND createdOn <= {end}"
+
+    # Only the count is needed, so fetch a single row and let Synapse
+    # report the total instead of paging through every submission.
+    query += " LIMIT 1 OFFSET 0"
+    results = syn.restGET("/evaluation/submission/query?query="
+                          + urllib.parse.quote_plus(query))
+    return results.get("totalNumberOfResults", 0)
 
 
 def count_submissions(syn, evaluations, start=None, end=None):
     """Tally up all valid submissions from given evaluations.
 
+    Args:
+        start: Epoch timestamp (ms) of earliest submission to count
+        end: Epoch timestamp (ms) of latest submission to count
+
     Returns:
         total: total number of submissions from challenge queues
     """
 
-    if start:
-        start = convert_to_epoch(start)
-    if end:
-        end = convert_to_epoch(end)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        counts = executor.map(
+            functools.partial(count_eval_submissions, syn,
+                              start=start, end=end),
+            evaluations)
+        return sum(counts)
 
-    total = 0
-    for eval_id in evaluations:
-        query = f"SELECT * FROM evaluation_{eval_id} WHERE status == 'ACCEPTED'"
-        if start:
-            query += f" AND createdOn >= {start}"
-        if end:
-            query += f" AND createdOn <= {end}"
-        total += sum(1 for sub in utils.evaluation_queue_query(
-            syn, query, limit=13))
-    return total
+
+def get_challenge_stats(syn, challenge, start=None, end=None):
+    """Get registrants and submission count for a given challenge.
+
+    Returns:
+        c_id: challenge ID (which is different from Synapse ID)
+        name: challenge name
+        team: participant team ID for challenge
+        participants: set of user IDs registered for challenge
+        submissions: number of valid submissions for challenge
+    """
+
+    c_id, name, team, eval_ids = get_challenge_info(syn, challenge)
+    participants = get_participants(syn, team)
+    submissions = count_submissions(syn, eval_ids, start, end)
+    return c_id, name, team, participants, submissions
 
 
 def print_report(syn, args):
     """Print report."""
 
-    unique_users = set()
-    total_submissions = 0
-    for challenge in args.challenge_ids:
-        c_id, name, team, eval_ids = get_challenge_info(syn, challenge)
-        participants = {user.get('ownerId')
-                        for user in teams._get_team_set(syn, team)}  # pylint: disable=W0212
-
-        # Keep track of unique users across all challenges.
-        unique_users = unique_users.union(participants)
-
-        # Count number of submissions for challenge, then add to total.
-        submissions = count_submissions(syn, eval_ids,
-                                        args.start_date,
-                                        args.end_date)
-        total_submissions += submissions
-
-        print("\t".join([c_id, name, team,
-                         str(len(participants)),
-                         str(submissions)]))
+    # Parse date range once, rather than once per challenge.
+    start = convert_to_epoch(args.start_date) if args.start_date else None
+    end = convert_to_epoch(args.end_date) if args.end_date else None
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        stats = executor.map(
+            functools.partial(get_challenge_stats, syn,
+                              start=start, end=end),
+            args.challenge_ids)
+
+        unique_users = set()
+        total_submissions = 0
+        for c_id, name, team, participants, submissions in stats:
+
+            # Keep track of unique users across all challenges.
+            unique_users |= participants
+            total_submissions += submissions
+
+            print("\t".join([c_id, name, team,
+                             str(len(participants)),
+                             str(submissions)]))
 
     print("=" * 20)
     print("Total registrants for challenges:", len(unique_users))